@@ -122,8 +122,19 @@ class GitRepository():
 
         self.commit_failure_count = 0
 
+        # number of commits in the branch when git am was started,
+        # None if not running
+        self.am_orig_head = None
+
+        # parents of the commits created with commit-tree, key is
+        # commit id and value is the parent commit id
+        self.parents = {}
+
         self.stg_import_failure = 0
 
+        # if True git merge-tree reports a conflict
+        self.merge_tree_conflict = False
+
     def dump(self):
         path = os.path.join(self.gitdir, GIT_DB_NAME)
 
@@ -186,6 +197,54 @@ class GitRepository():
         commit_id = hashlib.sha1(mbox.encode('utf-8')).hexdigest()
         return self._add_commit(commit_id, mbox)
 
+    def start_am(self):
+        self.am_orig_head = len(self.branches[self.head])
+        self.dump()
+
+    # like with real git, removes all commits done by the last am
+    def abort_am(self):
+        if self.am_orig_head is None:
+            return
+
+        del self.branches[self.head][self.am_orig_head:]
+        self.am_orig_head = None
+        self.dump()
+
+    # the tree id is the id of the commit which content is used
+    def create_tree_commit(self, tree_id, parent_id, message):
+        if tree_id not in self.commits:
+            raise ValueError('tree %s not found' % (tree_id))
+
+        buf = '%s\n%s\n%s' % (tree_id, parent_id, message)
+        commit_id = hashlib.sha1(buf.encode('utf-8')).hexdigest()
+
+        commit = GitCommit(commit_id, self.commits[tree_id].mbox)
+        self.commits[commit_id] = commit
+        self.parents[commit_id] = parent_id
+
+        self.dump()
+
+        return commit
+
+    def fast_forward(self, commit_id):
+        branch = self.branches[self.head]
+
+        if len(branch) > 0:
+            head_id = branch[-1].id
+        else:
+            head_id = None
+
+        chain = []
+        while commit_id != head_id:
+            if commit_id not in self.parents:
+                raise ValueError('Not possible to fast-forward')
+
+            chain.insert(0, self.commits[commit_id])
+            commit_id = self.parents[commit_id]
+
+        branch.extend(chain)
+        self.dump()
+
     def delete_top_commit(self):
         self.branches[self.head].pop()
         self.dump()
@@ -257,6 +316,11 @@ class GitRepository():
         self.stg_patches.popitem()
         self.delete_top_commit()
 
+    def set_merge_tree_conflict(self, val):
+        self.merge_tree_conflict = val
+
+        self.dump()
+
     # An integer which patch import should fail (3 = the third import
     # fails)
     def set_stg_import_failure(self, val):
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2015, The Linux Foundation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+
+import unittest
+import mock
+import tempfile
+import shutil
+import os
+
+
+import pwcli
+
+URL = 'http://localhost:8000/api/1.2/patches/'
+
+
+def create_response(content, status_code=200):
+    response = mock.Mock()
+    response.status_code = status_code
+    response.reason = 'OK'
+    response.headers = {'Content-Type': 'application/json',
+                        'Set-Cookie': 'foo'}
+    response.content = content
+
+    return response
+
+
+class TestCassette(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'cassette.json.gz')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def record(self, requests):
+        cassette = pwcli.Cassette(self.path, pwcli.Cassette.MODE_RECORD)
+
+        for (method, url, kwargs, response) in requests:
+            cassette.record(method, url, kwargs, response, 0.25)
+
+        cassette.save()
+
+    @mock.patch('pwcli.time.sleep')
+    def test_replay(self, sleep):
+        params = {'state': ['new', 'under-review'],
+                  'since': '2020-01-01T00:00:00'}
+        self.record([('GET', URL, {'params': params}, create_response(b'[1]')),
+                     ('GET', URL, {'params': params}, create_response(b'[2]')),
+                     ('GET', URL + '1/', {}, create_response(b'\xff\xfe', 404)),
+                     ('PATCH', URL + '1/', {'json': {'state': 'new'}},
+                      create_response(b'{}'))])
+
+        cassette = pwcli.Cassette(self.path, pwcli.Cassette.MODE_REPLAY)
+
+        # since is ignored, the responses are replayed in order and
+        # the last one is repeated
+        params['since'] = '2021-01-01T00:00:00'
+        self.assertEqual(cassette.replay('GET', URL, {'params': params}).json(), [1])
+        self.assertEqual(cassette.replay('GET', URL, {'params': params}).json(), [2])
+        self.assertEqual(cassette.replay('GET', URL, {'params': params}).json(), [2])
+        sleep.assert_called_with(0.25)
+
+        response = cassette.replay('GET', URL + '1/', {})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.content, b'\xff\xfe')
+        self.assertEqual(response.headers['Content-Type'], 'application/json')
+        self.assertNotIn('Set-Cookie', response.headers)
+
+        with self.assertRaises(pwcli.requests.exceptions.ConnectionError):
+            cassette.replay('PATCH', URL + '1/', {'json': {'state': 'accepted'}})
+
+        self.assertEqual(cassette.replay('PATCH', URL + '1/',
+                                         {'json': {'state': 'new'}}).status_code,
+                         200)
+
+    @mock.patch('pwcli.time.sleep')
+    def test_latency(self, sleep):
+        self.record([('GET', URL, {}, create_response(b'[]'))])
+
+        cassette = pwcli.Cassette(self.path, pwcli.Cassette.MODE_REPLAY, 0)
+        cassette.replay('GET', URL, {})
+        sleep.assert_not_called()
+
+        cassette = pwcli.Cassette(self.path, pwcli.Cassette.MODE_REPLAY, 2.0)
+        cassette.replay('GET', URL, {})
+        sleep.assert_called_once_with(2.0)
+
+    def test_invalid(self):
+        with self.assertRaises(pwcli.PwcliError):
+            pwcli.Cassette(self.path, pwcli.Cassette.MODE_REPLAY)
+
+
+if __name__ == '__main__':
+    unittest.main()
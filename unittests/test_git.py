@@ -32,6 +32,7 @@
 #
 
 import unittest
+import mock
 import subprocess
 import tempfile
 import os
@@ -41,6 +42,10 @@ import stubslib
 
 from pwcli import Git
 from pwcli import GitCommit
+from pwcli import GitError
+from pwcli import PWCLI
+from pwcli import Stg
+from pwcli import StgIndex
 
 
 class TestGit(unittest.TestCase):
@@ -96,9 +101,282 @@ foo body
         gitrepo = stubslib.GitRepository.load(self.datadir)
         self.assertEqual(gitrepo.get_commits()[0].mbox, mbox)
 
+    def test_get_commit(self):
+        mbox = '''From nobody
+From: Ed Example <ed@example.com>
+Subject: [PATCH] foo: first
+Date: Thu, 10 Feb 2011 15:23:31 +0300
+
+foo body
+'''
+        git = Git(self.dummy_output)
+        git.am(mbox)
+
+        commit = git.get_commit('HEAD')
+        gitrepo = stubslib.GitRepository.load(self.datadir)
+        self.assertEqual(commit.commit_id, gitrepo.get_commits()[-1].id)
+        self.assertEqual(commit.title, 'foo: first')
+
+        # the same process sees the new commit
+        git.am(mbox.replace('first', 'second'))
+        self.assertEqual(git.get_commit('HEAD').title, 'foo: second')
+        self.assertEqual(git.reader.starts, 1)
+
+        with self.assertRaises(GitError):
+            git.get_commit('foo')
+
+        # the process is restarted if it dies
+        git.reader.p.kill()
+        git.reader.p.wait()
+        self.assertEqual(git.get_commit('HEAD').title, 'foo: second')
+        self.assertEqual(git.reader.starts, 2)
+
+        git.stop()
+
+    def test_am_multiple(self):
+        mbox = '''From nobody Mon Sep 17 00:00:00 2001
+From: Ed Example <ed@example.com>
+Subject: [PATCH] foo: patch %d
+Date: Thu, 10 Feb 2011 15:23:31 +0300
+
+foo body
+'''
+        mboxes = '\n'.join([mbox % (i) for i in range(1, 4)])
+        counts = []
+
+        git = Git(self.dummy_output)
+        git.am(mboxes, applied_cb=counts.append)
+
+        self.assertEqual(counts, [1, 2, 3])
+
+        commits = git.get_commits(3)
+        self.assertEqual([c.title for c in commits],
+                         ['foo: patch 1', 'foo: patch 2', 'foo: patch 3'])
+
+        # all patches are removed if one of them fails
+        gitrepo = stubslib.GitRepository.load(self.datadir)
+        gitrepo.set_commit_failure(2)
+
+        with self.assertRaises(GitError) as cm:
+            git.am(mboxes)
+
+        self.assertTrue(cm.exception.log.startswith('Applying: foo: conflict patch'))
+
+        gitrepo = stubslib.GitRepository.load(self.datadir)
+        self.assertEqual(len(gitrepo.get_commits()), 3)
+        self.assertEqual(git.get_commit('HEAD').commit_id, commits[-1].commit_id)
+
+        git.stop()
+
+    def test_commit_tree(self):
+        mbox = '''From nobody Mon Sep 17 00:00:00 2001
+From: Ed Example <ed@example.com>
+Subject: [PATCH] foo: patch %d
+Date: Thu, 10 Feb 2011 15:23:31 +0300
+
+foo body
+'''
+        git = Git(self.dummy_output)
+        git.am('\n'.join([mbox % (i) for i in range(1, 3)]))
+        (first, second) = git.get_commits(2)
+
+        self.assertTrue(git.has_merge_tree())
+
+        tree_id = git.merge_tree(first.commit_id, second.commit_id,
+                                 second.commit_id)
+        commit_id = git.commit_tree(tree_id, second.commit_id, 'foo\n\nbar\n',
+                                    author=second.author)
+
+        # the branch is not changed until fast forwarded
+        self.assertEqual(git.get_commit('HEAD').commit_id, second.commit_id)
+        self.assertEqual(git.get_commit(commit_id).parent_ids,
+                         [second.commit_id])
+
+        git.fast_forward(commit_id)
+        self.assertEqual(git.get_commit('HEAD').commit_id, commit_id)
+
+        git.stop()
+
+    def test_commit_tree_conflict(self):
+        mbox = '''From nobody Mon Sep 17 00:00:00 2001
+From: Ed Example <ed@example.com>
+Subject: [PATCH] foo: patch %d
+Date: Thu, 10 Feb 2011 15:23:31 +0300
+
+foo body
+'''
+        git = Git(self.dummy_output)
+        git.am('\n'.join([mbox % (i) for i in range(1, 4)]))
+        commits = git.get_commits(3)
+
+        gitrepo = stubslib.GitRepository.load(self.datadir)
+        gitrepo.set_merge_tree_conflict(True)
+
+        with self.assertRaises(GitError) as cm:
+            git.merge_tree(commits[0].commit_id, commits[2].commit_id,
+                           commits[1].commit_id)
+
+        self.assertIn('CONFLICT (content)', cm.exception.log)
+
+        # the patches are not committed and the branch is left untouched
+        pwcli = PWCLI.__new__(PWCLI)
+        pwcli.git = git
+        pwcli.output = mock.Mock()
+        pwcli.config = mock.Mock()
+        pwcli.config.msgid_tag = None
+
+        patches = []
+        for commit in commits[1:]:
+            patch = mock.Mock()
+            patch.pending_commit = commit
+            patch.get_name = mock.Mock(return_value=commit.title)
+            patches.append(patch)
+
+        applied = []
+
+        with self.assertRaises(GitError) as cm:
+            pwcli.commit_tree_patches(patches, applied)
+
+        self.assertTrue(str(cm.exception).startswith('foo: patch 2: '))
+        self.assertEqual(applied, [])
+
+        gitrepo = stubslib.GitRepository.load(self.datadir)
+        self.assertEqual([c.id for c in gitrepo.get_commits()],
+                         [c.commit_id for c in commits])
+        self.assertEqual(git.get_commit('HEAD').commit_id, commits[2].commit_id)
+
+        git.stop()
+
+    def test_commit_tree_root(self):
+        pwcli = PWCLI.__new__(PWCLI)
+        pwcli.git = mock.Mock()
+        pwcli.cherry_pick_patches = mock.Mock()
+
+        root = GitCommit()
+        root.commit_id = '1234'
+        pwcli.git.get_commit = mock.Mock(return_value=root)
+
+        patch = mock.Mock()
+        patch.pending_commit = root
+        applied = []
+
+        # git merge-tree can't be used with a root commit
+        pwcli.commit_tree_patches([patch], applied)
+
+        pwcli.cherry_pick_patches.assert_called_once_with([patch], applied)
+        pwcli.git.merge_tree.assert_not_called()
+
+    def test_stg_get_stack(self):
+        mbox = '''From nobody
+From: Ed Example <ed@example.com>
+Subject: [PATCH] foo: patch %d
+Date: Thu, 10 Feb 2011 15:23:31 +0300
+
+foo body
+
+Patchwork-Id: %d
+---
+'''
+        gitrepo = stubslib.GitRepository.load(self.datadir)
+        commits = [gitrepo.import_stg_commit(mbox % (i, 100 + i)) for i in range(1, 3)]
+
+        git = Git(self.dummy_output)
+        stg = Stg(self.dummy_output, git)
+
+        (stack_id, stack) = stg.get_stack('pending')
+        self.assertEqual(stack, [('foo-patch-1', commits[0].id),
+                                 ('foo-patch-2', commits[1].id)])
+
+        commit = git.get_commit(stack[1][1])
+        self.assertEqual(commit.patchwork_id, 102)
+        self.assertEqual(commit.title, 'foo: patch 2')
+
+        git.stop()
+
+    def test_stg_index(self):
+        mbox = '''From nobody
+From: Ed Example <ed@example.com>
+Subject: [PATCH] foo: patch %d
+Date: Thu, 10 Feb 2011 15:23:31 +0300
+
+foo body
+
+Patchwork-Id: %d
+---
+'''
+        gitrepo = stubslib.GitRepository.load(self.datadir)
+        gitrepo.import_stg_commit(mbox % (1, 101))
+        gitrepo.import_stg_commit(mbox % (2, 102))
+
+        git = Git(self.dummy_output)
+        stg = Stg(self.dummy_output, git)
+        index = StgIndex(git, stg, 'pending')
+
+        with mock.patch.object(git, 'get_commit', wraps=git.get_commit) as get_commit:
+            (name, commit) = index.get(102)
+            self.assertEqual(name, 'foo-patch-2')
+            self.assertEqual(get_commit.call_count, 2)
+            self.assertIsNone(index.get(103))
+
+            # nothing changed, nothing is read
+            get_commit.reset_mock()
+            self.assertEqual([n for (n, c) in index.get_entries()],
+                             ['foo-patch-1', 'foo-patch-2'])
+            get_commit.assert_not_called()
+
+            # only the new patch is read
+            gitrepo = stubslib.GitRepository.load(self.datadir)
+            new = gitrepo.import_stg_commit(mbox % (3, 103))
+            self.assertEqual(index.get(103)[1].commit_id, new.id)
+            self.assertEqual(get_commit.call_count, 1)
+
+            # an edited patch is not stale
+            gitrepo = stubslib.GitRepository.load(self.datadir)
+            edited = gitrepo.import_stg_commit(mbox.replace('foo body', 'bar body') % (1, 101))
+            gitrepo = stubslib.GitRepository.load(self.datadir)
+            gitrepo.stg_patches['foo-patch-1'] = edited
+            gitrepo.dump()
+
+            self.assertEqual(index.get(101)[1].commit_id, edited.id)
+
+        git.stop()
+
 
 class TestGitCommit(unittest.TestCase):
 
+    def test_parse_commit_object(self):
+        content = '''tree 4b825dc642cb6eb9a060e54bf8d69288fbee4904
+parent 5a0a5b9792110d74989963154bc2ed545e9c809d
+author Ed Example <ed@example.com> 1792321707 +0000
+committer Ed Example <ed@example.com> 1792321707 +0000
+
+foo: this is
+ a long title
+
+This is the log.
+
+Patchwork-Id: 12345678
+Signed-off-by: Ed Example <ed@example.com>
+'''
+        commit = GitCommit.parse_commit_object('07701d002c8c24e73c6cc51177981ce54fdb2b31',
+                                               content)
+
+        self.assertEqual(commit.commit_id,
+                         '07701d002c8c24e73c6cc51177981ce54fdb2b31')
+        self.assertEqual(commit.title, 'foo: this is  a long title')
+        self.assertEqual(commit.log,
+                         'This is the log.\n\nPatchwork-Id: 12345678\nSigned-off-by: Ed Example <ed@example.com>\n')
+        self.assertEqual(commit.patchwork_id, 12345678)
+        self.assertEqual(commit.parent_ids,
+                         ['5a0a5b9792110d74989963154bc2ed545e9c809d'])
+        self.assertEqual(commit.author,
+                         'Ed Example <ed@example.com> 1792321707 +0000')
+
+        commit.remove_tag('Patchwork-Id:')
+        commit.add_tag('Link: https://example.com/1')
+        self.assertEqual(commit.get_message(),
+                         'foo: this is  a long title\n\nThis is the log.\n\nSigned-off-by: Ed Example <ed@example.com>\nLink: https://example.com/1\n')
+
     def test_parse_stg_show(self):
         f = open('stg-show-1.data')
         commit = GitCommit.parse_stg_show(f.read())
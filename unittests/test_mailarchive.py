@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2015, The Linux Foundation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+
+import unittest
+import mock
+import tempfile
+import shutil
+import os
+
+import mailbox
+
+import pwcli
+
+PATCH = '''From: Alice <alice@example.com>
+Subject: [PATCH 1/2] foo: fix bar
+Message-Id: <1@example.com>
+Content-Type: text/plain; charset="utf-8"
+
+Fix the bar.
+
+Signed-off-by: Alice <alice@example.com>
+---
+ foo.c | 1 +
+
+diff --git a/foo.c b/foo.c
+'''
+
+PATCH2 = '''From: Alice <alice@example.com>
+Subject: [PATCH 2/2] foo: fix baz
+Message-Id: <2@example.com>
+In-Reply-To: <1@example.com>
+References: <1@example.com>
+
+Fix the baz.
+
+Signed-off-by: Alice <alice@example.com>
+---
+ foo.c | 1 +
+'''
+
+REPLY = '''From: Bob <bob@example.com>
+Subject: Re: [PATCH 1/2] foo: fix bar
+Message-Id: <3@example.com>
+In-Reply-To: <1@example.com>
+References: <1@example.com>
+
+> Fix the bar.
+
+Reviewed-by: Bob <bob@example.com>
+'''
+
+# a reply to the second patch refers also to the first patch
+REPLY2 = '''From: Carol <carol@example.com>
+Subject: Re: [PATCH 2/2] foo: fix baz
+Message-Id: <4@example.com>
+In-Reply-To: <2@example.com>
+References: <1@example.com> <2@example.com>
+
+Acked-by: Carol <carol@example.com>
+'''
+
+
+class TestMailArchive(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.index = os.path.join(self.tmpdir, 'archive.json.gz')
+        self.pw = mock.Mock()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def create_maildir(self, mails):
+        path = os.path.join(self.tmpdir, 'maildir')
+        md = mailbox.Maildir(path)
+
+        for mail in mails:
+            md.add(mail)
+
+        return (path, md)
+
+    def create_mbox(self, mails):
+        path = os.path.join(self.tmpdir, 'mbox')
+        mbox = mailbox.mbox(path)
+
+        for mail in mails:
+            mbox.add(mail)
+
+        mbox.close()
+
+        return path
+
+    def check_archive(self, archive):
+        self.assertTrue(archive.contains('1@example.com'))
+        self.assertFalse(archive.contains('5@example.com'))
+
+        comments = archive.get_comments(self.pw, '1@example.com')
+        self.assertEqual(comments.get_count(), 1)
+        self.assertEqual(comments.get_reviewed_by_count(), 1)
+        self.assertEqual(comments.get_acked_by_count(), 0)
+
+        comments = archive.get_comments(self.pw, '2@example.com')
+        self.assertEqual(comments.get_count(), 1)
+        self.assertEqual(comments.get_acked_by_count(), 1)
+
+        self.assertIsNone(archive.get_comments(self.pw, '5@example.com'))
+
+        mbox = archive.get_mbox('1@example.com')
+        self.assertIn('Signed-off-by: Alice <alice@example.com>\n'
+                      'Reviewed-by: Bob <bob@example.com>\n'
+                      '---\n', mbox)
+        self.assertIn('Subject: [PATCH 1/2] foo: fix bar', mbox)
+        self.assertNotIn('Acked-by', mbox)
+
+    def test_maildir(self):
+        (path, md) = self.create_maildir([PATCH, PATCH2, REPLY, REPLY2])
+
+        archive = pwcli.MailArchive(path, self.index)
+        archive.update()
+        self.check_archive(archive)
+
+        # a new instance reads the index from the disk
+        archive = pwcli.MailArchive(path, self.index)
+        archive.update()
+        self.check_archive(archive)
+
+    def test_maildir_remove(self):
+        (path, md) = self.create_maildir([PATCH, PATCH2, REPLY2])
+        key = md.add(REPLY)
+
+        archive = pwcli.MailArchive(path, self.index)
+        archive.update()
+        self.assertTrue(archive.contains('3@example.com'))
+
+        md.remove(key)
+        archive.update()
+        self.assertFalse(archive.contains('3@example.com'))
+
+        comments = archive.get_comments(self.pw, '1@example.com')
+        self.assertEqual(comments.get_count(), 0)
+
+    def test_mbox(self):
+        path = self.create_mbox([PATCH, PATCH2, REPLY, REPLY2])
+
+        archive = pwcli.MailArchive(path, self.index)
+        archive.update()
+        self.check_archive(archive)
+
+    def test_mbox_incremental(self):
+        path = self.create_mbox([PATCH, PATCH2, REPLY2])
+
+        archive = pwcli.MailArchive(path, self.index)
+        archive.update()
+        self.assertFalse(archive.contains('3@example.com'))
+
+        mbox = mailbox.mbox(path)
+        mbox.add(REPLY)
+        mbox.close()
+
+        # only the appended mail is read
+        with mock.patch.object(archive, '_add',
+                               wraps=archive._add) as add:
+            archive.update()
+            self.assertEqual(add.call_count, 1)
+
+        self.check_archive(archive)
+
+        # a rewritten mbox is indexed again
+        path = self.create_mbox([])
+        os.remove(path)
+        path = self.create_mbox([PATCH])
+        archive.update()
+        self.assertTrue(archive.contains('1@example.com'))
+        self.assertFalse(archive.contains('3@example.com'))
+
+    def test_mbox_no_tags(self):
+        path = self.create_mbox([PATCH2])
+
+        archive = pwcli.MailArchive(path, self.index)
+        archive.update()
+
+        mbox = archive.get_mbox('2@example.com')
+        self.assertIn('Fix the baz.\n', mbox)
+        self.assertIsNone(archive.get_mbox('1@example.com'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2015, The Linux Foundation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+
+import unittest
+import mock
+import tempfile
+import shutil
+import os
+
+import pwcli
+
+
+class TestMboxStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'mbox')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_get_put(self):
+        store = pwcli.MboxStore(self.path, 1024 * 1024)
+
+        self.assertIsNone(store.get(1001, '<11111@example.com>'))
+        self.assertFalse(store.contains(1001, '<11111@example.com>'))
+
+        store.put(1001, '<11111@example.com>', 'Subject: foo tèst\n\nbar\n')
+
+        self.assertTrue(store.contains(1001, '<11111@example.com>'))
+        self.assertEqual(store.get(1001, '<11111@example.com>'),
+                         'Subject: foo tèst\n\nbar\n')
+
+        # same id but different msgid is a different mbox
+        self.assertIsNone(store.get(1001, '<22222@example.com>'))
+
+        # a new store finds the mboxes from the disk
+        store = pwcli.MboxStore(self.path, 1024 * 1024)
+        self.assertEqual(store.get(1001, '<11111@example.com>'),
+                         'Subject: foo tèst\n\nbar\n')
+
+    def test_evict(self):
+        # random data so that gzip can't compress it much
+        data = [os.urandom(400).hex() for i in range(4)]
+
+        store = pwcli.MboxStore(self.path, 1200)
+
+        store.put(1, 'a', data[0])
+        store.put(2, 'b', data[1])
+
+        # use the first one so the second is the least recently used
+        self.assertEqual(store.get(1, 'a'), data[0])
+
+        store.put(3, 'c', data[2])
+
+        self.assertLessEqual(store.size, 1200)
+        self.assertTrue(store.contains(1, 'a'))
+        self.assertFalse(store.contains(2, 'b'))
+        self.assertTrue(store.contains(3, 'c'))
+        self.assertEqual(len(os.listdir(self.path)), 2)
+
+    def test_patch(self):
+        pw = mock.Mock()
+        pw.mbox_store = pwcli.MboxStore(self.path, 1024 * 1024)
+        pw.mail_archive = None
+        pw.get_mbox = mock.Mock(return_value='Subject: foo\n\nbar\n')
+
+        patch = pwcli.Patch(pw)
+        patch.parse_json({
+            'id': 11,
+            'web_url': 'http://www.example.com/',
+            'msgid': '<12345678>',
+            'date': '2020-04-23T15:06:27',
+            'name': 'foo',
+            'commit_ref': None,
+            'state': 'new',
+            'submitter': {'name': 'Ed Example',
+                          'email': 'ed@example.com'},
+            'delegate': None,
+            'mbox': 'http://www.example.com/mbox/',
+            'series': [],
+            'pull_url': None,
+        })
+
+        self.assertFalse(patch.has_mbox())
+        self.assertEqual(patch.get_mbox(), 'Subject: foo\n\nbar\n')
+        self.assertTrue(patch.has_mbox())
+
+        # the mbox is not kept in memory and it's downloaded only once
+        self.assertIsNone(patch.mbox)
+        self.assertEqual(patch.get_mbox(), 'Subject: foo\n\nbar\n')
+        pw.get_mbox.assert_called_once()
+
+        # an edited mbox is not written to the store
+        patch.set_mbox('Subject: edited\n\nbar\n')
+        self.assertEqual(patch.get_mbox(), 'Subject: edited\n\nbar\n')
+        self.assertEqual(pw.mbox_store.get(11, '<12345678>'),
+                         'Subject: foo\n\nbar\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2015, The Linux Foundation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import unittest
+import mock
+import json
+import tracemalloc
+
+import pwcli
+
+PATCH_JSON = '''{
+    "id": %d,
+    "web_url": "https://patchwork.example.com/project/foo/patch/%d/",
+    "msgid": "<20200423150627.%d-1-ed@example.com>",
+    "date": "2020-04-23T15:06:27",
+    "name": "[v2,%d/9] foo: fix a bug in the bar handling",
+    "commit_ref": null,
+    "pull_url": null,
+    "state": "under-review",
+    "submitter": {"name": "Ed Example", "email": "ed@example.com"},
+    "delegate": {"username": "dddd"},
+    "mbox": "https://patchwork.example.com/project/foo/patch/%d/mbox/",
+    "series": [{"id": 100}]
+}'''
+
+COMMENT = '''Ed Example <ed@example.com> wrote:
+
+> Fix a bug in the bar handling.
+%s
+Reviewed-by: Rob Reviewer <rob@example.com>
+'''
+
+# the old data model: dict-backed, strings not interned and comments
+# keeping the content
+
+
+class DictPatch():
+    parse_json = pwcli.Patch.parse_json
+    __init__ = pwcli.Patch.__init__
+
+
+class DictComment():
+    def parse_json(self, data):
+        self._id = data['id']
+        self._content = data['content']
+
+    def __init__(self, pw):
+        self.pw = pw
+
+
+# Not an exact benchmark, tracemalloc measures the memory still
+# allocated after the objects are created. Shows how much memory the
+# compact data model saves and makes sure it stays compact.
+class TestMemory(unittest.TestCase):
+    COUNT = 2000
+
+    def measure(self, cls, create_data):
+        tracemalloc.start()
+
+        objects = []
+        for i in range(self.COUNT):
+            obj = cls(None)
+            obj.parse_json(create_data(i))
+            objects.append(obj)
+
+        (current, peak) = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        return current // self.COUNT
+
+    def create_patch_data(self, i):
+        # json.loads() creates new strings every time, like when the
+        # patches are received from the server
+        return json.loads(PATCH_JSON % (i, i, i, i, i))
+
+    def create_comment_data(self, i):
+        return json.loads(json.dumps({'id': i, 'content': COMMENT % ('> foo\n' * 200)}))
+
+    def test_patch(self):
+        compact = self.measure(pwcli.Patch, self.create_patch_data)
+
+        with mock.patch('pwcli.intern_str', side_effect=lambda s: s):
+            old = self.measure(DictPatch, self.create_patch_data)
+
+        self.assertFalse(hasattr(pwcli.Patch(None), '__dict__'))
+        self.assertLess(compact, old * 0.5,
+                        'Patch uses %d bytes, old %d bytes' % (compact, old))
+
+    def test_comment(self):
+        compact = self.measure(pwcli.Comment, self.create_comment_data)
+        old = self.measure(DictComment, self.create_comment_data)
+
+        self.assertLess(compact, old * 0.2,
+                        'Comment uses %d bytes, old %d bytes' % (compact, old))
+
+
+if __name__ == '__main__':
+    unittest.main()
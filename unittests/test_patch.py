@@ -34,6 +34,8 @@
 import unittest
 import mock
 import email
+import base64
+import quopri
 import re
 
 import pwcli
@@ -77,12 +79,14 @@ class TestPatch(unittest.TestCase):
         patch = pwcli.Patch(None)
         patch.parse_json(FAKE_ATTRIBUTES)
 
-        patch.get_email = mock.Mock(return_value=email.message_from_string(TEST_MBOX))
-        patch.get_url = mock.Mock(return_value='http://localhost:8000/1001/')
-
         from_name = 'Matt Edmond'
         from_email = 'me@example.com'
-        reply = patch.get_reply_msg(from_name, from_email)
+
+        # Patch uses slots, methods need to be mocked in the class
+        with mock.patch.object(pwcli.Patch, 'get_mbox', return_value=TEST_MBOX), \
+             mock.patch.object(pwcli.Patch, 'get_url',
+                               return_value='http://localhost:8000/1001/'):
+            reply = patch.get_reply_msg(from_name, from_email)
 
         self.assertEqual(reply['From'], '%s <%s>' % (from_name, from_email))
         self.assertEqual(reply['To'], 'Dino Dinosaurus <dino@example.com>')
@@ -98,9 +102,13 @@ class TestPatch(unittest.TestCase):
         patch = pwcli.Patch(None)
         patch.parse_json(attributes)
 
-        patch.get_mbox = mock.Mock(return_value=TEST_MBOX)
+        with mock.patch.object(pwcli.Patch, 'get_mbox', return_value=TEST_MBOX), \
+             mock.patch('email.message_from_string') as parse:
+            mbox = patch.get_mbox_for_stgit()
+
+        # only the headers are parsed
+        parse.assert_not_called()
 
-        mbox = patch.get_mbox_for_stgit()
         msg = email.message_from_string(mbox)
 
         # Check that the first line matches mbox format
@@ -118,6 +126,102 @@ class TestPatch(unittest.TestCase):
         search = re.search(id_line, msg.get_payload())
         self.assertTrue(search is not None)
 
+    def test_get_mbox_for_am(self):
+        patch = pwcli.Patch(None)
+        patch.parse_json(FAKE_ATTRIBUTES)
+
+        with mock.patch.object(pwcli.Patch, 'get_mbox', return_value=TEST_MBOX):
+            mbox = patch.get_mbox_for_am(['Link: https://example.com/11111'])
+
+            # the original mbox is otherwise unchanged
+            self.assertEqual(mbox.splitlines()[0],
+                             'From nobody Mon Sep 17 00:00:00 2001')
+            self.assertEqual(mbox.replace('Link: https://example.com/11111\n', ''),
+                             'From nobody Mon Sep 17 00:00:00 2001\n' + TEST_MBOX)
+
+            msg = email.message_from_string(mbox)
+            self.assertIn('\nLink: https://example.com/11111\n---\n',
+                          msg.get_payload())
+
+            # without tags only the From line is added
+            self.assertEqual(patch.get_mbox_for_am([]),
+                             'From nobody Mon Sep 17 00:00:00 2001\n' + TEST_MBOX)
+
+        # the end of the commit log isn't found, the caller applies
+        # the mbox as is and adds the tags to the commit
+        mbox = TEST_MBOX.replace('---\n', '')
+        with mock.patch.object(pwcli.Patch, 'get_mbox', return_value=mbox):
+            self.assertIsNone(patch.get_mbox_for_am(['Link: https://example.com/11111']))
+            self.assertEqual(patch.get_mbox_for_am([]),
+                             'From nobody Mon Sep 17 00:00:00 2001\n' + mbox)
+
+        # CRLF line endings
+        (headers, sep, body) = TEST_MBOX.partition('\n\n')
+        mbox = headers + sep + body.replace('\n', '\r\n')
+        with mock.patch.object(pwcli.Patch, 'get_mbox', return_value=mbox):
+            mbox = patch.get_mbox_for_am(['Link: https://example.com/11111'])
+            self.assertIn('\r\nLink: https://example.com/11111\r\n---\r\n', mbox)
+
+    def test_get_mbox_for_am_encoded(self):
+        patch = pwcli.Patch(None)
+        patch.parse_json(FAKE_ATTRIBUTES)
+
+        (headers, sep, body) = TEST_MBOX.partition('\n\n')
+        body = body.replace('Foo commit', 'Föö commit')
+
+        for (encoding, encoded) in [('base64', base64.encodebytes(body.encode('utf-8'))),
+                                    ('quoted-printable', quopri.encodestring(body.encode('utf-8')))]:
+            mbox = headers.replace('7bit', encoding) + sep + encoded.decode('ascii')
+
+            with mock.patch.object(pwcli.Patch, 'get_mbox', return_value=mbox):
+                result = patch.get_mbox_for_am(['Link: https://example.com/11111'])
+
+            msg = email.message_from_string(result)
+            self.assertEqual(msg['Content-Transfer-Encoding'], encoding)
+
+            payload = msg.get_payload(decode=True).decode('utf-8')
+            self.assertEqual(payload,
+                             body.replace('---\n', 'Link: https://example.com/11111\n---\n'))
+
+        # can't be decoded, the caller needs to add the tags
+        mbox = headers.replace('7bit', 'base64').replace('utf-8', 'foo') + sep + \
+            base64.encodebytes(body.encode('utf-8')).decode('ascii')
+
+        with mock.patch.object(pwcli.Patch, 'get_mbox', return_value=mbox):
+            self.assertIsNone(patch.get_mbox_for_am(['Link: https://example.com/11111']))
+
+    def test_email_view(self):
+        patch = pwcli.Patch(None)
+        patch.parse_json(FAKE_ATTRIBUTES)
+
+        with mock.patch.object(pwcli.Patch, 'get_mbox',
+                               return_value=TEST_MBOX) as get_mbox:
+            view = patch.get_email_view()
+
+            self.assertEqual(view.get_header('Subject'), '[1/7] foo')
+            self.assertEqual(patch.get_log(),
+                             'Foo commit log. Ignore this text\n\n'
+                             'Signed-off-by: Dino Dinosaurus <dino@example.com>')
+
+            # the whole mbox isn't kept in memory
+            self.assertFalse(hasattr(view, 'mbox'))
+
+            # the callers can modify the returned message
+            msg = patch.get_email()
+            msg.replace_header('Subject', 'bar')
+            self.assertEqual(patch.get_email()['Subject'], '[1/7] foo')
+
+            self.assertIs(patch.get_email_view(), view)
+            self.assertEqual(get_mbox.call_count, 3)
+
+        patch.pw = mock.Mock()
+        patch.pw.mbox_store = None
+        patch.set_mbox(TEST_MBOX.replace('[1/7] foo', '[1/7] bar'))
+
+        self.assertIsNot(patch.get_email_view(), view)
+        self.assertEqual(patch.get_name(), '[1/7] bar')
+        self.assertEqual(patch.get_email()['Subject'], '[1/7] bar')
+
     def test_clean_subject(self):
         patch = pwcli.Patch(None)
 
@@ -138,39 +242,35 @@ class TestPatch(unittest.TestCase):
         patch = pwcli.Patch(None)
 
         # mock get_name() method for easier testing
-        m = mock.Mock()
-        patch.get_name_original = m
-
-        m.return_value = 'foo: bar'
-        self.assertEqual(patch.get_patch_index(), None)
+        with mock.patch.object(pwcli.Patch, 'get_name_original') as m:
+            m.return_value = 'foo: bar'
+            self.assertEqual(patch.get_patch_index(), None)
 
-        m.return_value = '[1/2] foo: bar'
-        self.assertEqual(patch.get_patch_index(), 1)
+            m.return_value = '[1/2] foo: bar'
+            self.assertEqual(patch.get_patch_index(), 1)
 
-        m.return_value = '[99/200] foo: bar'
-        self.assertEqual(patch.get_patch_index(), 99)
+            m.return_value = '[99/200] foo: bar'
+            self.assertEqual(patch.get_patch_index(), 99)
 
-        m.return_value = '[for-3.4 200/200] foo: bar'
-        self.assertEqual(patch.get_patch_index(), 200)
+            m.return_value = '[for-3.4 200/200] foo: bar'
+            self.assertEqual(patch.get_patch_index(), 200)
 
     def test_get_tags(self):
         patch = pwcli.Patch(None)
 
         # mock get_name() method for easier testing
-        m = mock.Mock()
-        patch.get_name_original = m
-
-        m.return_value = 'foo: bar'
-        self.assertEqual(patch.get_tags(), None)
+        with mock.patch.object(pwcli.Patch, 'get_name_original') as m:
+            m.return_value = 'foo: bar'
+            self.assertEqual(patch.get_tags(), None)
 
-        m.return_value = '[v2] foo: bar'
-        self.assertEqual(patch.get_tags(), '[v2]')
+            m.return_value = '[v2] foo: bar'
+            self.assertEqual(patch.get_tags(), '[v2]')
 
-        m.return_value = '[2/2] foo: bar'
-        self.assertEqual(patch.get_tags(), '[2/2]')
+            m.return_value = '[2/2] foo: bar'
+            self.assertEqual(patch.get_tags(), '[2/2]')
 
-        m.return_value = '[RFC,7/9] foo: bar'
-        self.assertEqual(patch.get_tags(), '[RFC,7/9]')
+            m.return_value = '[RFC,7/9] foo: bar'
+            self.assertEqual(patch.get_tags(), '[RFC,7/9]')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2015, The Linux Foundation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import unittest
+import mock
+import tempfile
+import shutil
+import os
+import copy
+
+import pwcli
+
+FAKE_PATCH = {
+    'id': 11,
+    'web_url': 'http://www.example.com/',
+    'msgid': '<12345678>',
+    'date': '2020-04-23T15:06:27',
+    'name': 'nnnn',
+    'commit_ref': None,
+    'state': 'new',
+    'submitter': {'name': 'Ed Example',
+                  'email': 'ed@example.com'},
+    'delegate': {'username': 'dddd'},
+    'mbox': 'http://www.example.com/patch/11/mbox/',
+    'series': [],
+    'pull_url': None,
+}
+
+
+def create_patch(pw, state='new'):
+    data = copy.deepcopy(FAKE_PATCH)
+    data['state'] = state
+
+    patch = pwcli.Patch(pw)
+    patch.parse_json(data)
+    return patch
+
+
+class TestPatchJournal(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'journal.json')
+
+        self.pw = mock.Mock()
+        self.pw._fetch_patch = mock.Mock(side_effect=lambda i: create_patch(self.pw))
+
+        self.journal = pwcli.PatchJournal(self.pw, self.path)
+        self.pw.journal = self.journal
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    # the same as the worker thread does
+    def send_next(self):
+        self.journal.cond.acquire()
+        entry = self.journal._get_next()
+        changes = dict(entry['changes'])
+        base = dict(entry['base'])
+        self.journal.cond.release()
+
+        self.journal._send(entry, changes, base)
+
+    def test_send(self):
+        patch = create_patch(self.pw)
+        patch.set_state_name('under-review')
+        patch.set_state_name('accepted')
+        patch.set_commit_ref('abcd')
+
+        # the change is visible immediately, but not sent yet
+        self.assertEqual(patch.get_state_name(), 'accepted')
+        self.pw.update_patch.assert_not_called()
+
+        entries = self.journal.get_entries()
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0]['changes'], {'state': 'accepted',
+                                                 'commit_ref': 'abcd'})
+        self.assertEqual(entries[0]['base'], {'state': 'new',
+                                              'commit_ref': None})
+
+        self.send_next()
+
+        self.pw.update_patch.assert_called_once_with(11, state='accepted',
+                                                     commit_ref='abcd')
+        self.assertEqual(self.journal.get_pending_count(), 0)
+
+        # nothing to wait for
+        self.journal.flush(10)
+
+    def test_change_in_flight(self):
+        patch = create_patch(self.pw)
+        patch.set_state_name('accepted')
+
+        # the patch is changed again while the request is in flight
+        def fetch_patch(patch_id):
+            patch.set_commit_ref('abcd')
+            return create_patch(self.pw)
+
+        self.pw._fetch_patch = mock.Mock(side_effect=fetch_patch)
+
+        self.send_next()
+
+        self.pw.update_patch.assert_called_once_with(11, state='accepted')
+
+        # only the new change is left in the queue
+        entries = self.journal.get_entries()
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0]['changes'], {'commit_ref': 'abcd'})
+        self.assertEqual(entries[0]['base'], {'commit_ref': None})
+
+    def test_persistent(self):
+        patch = create_patch(self.pw)
+        patch.set_state_name('accepted')
+
+        journal = pwcli.PatchJournal(self.pw, self.path)
+        self.assertEqual(journal.get_pending_count(), 1)
+
+        # a patch from the server doesn't revert the queued change
+        patch = create_patch(self.pw)
+        journal.apply(patch)
+        self.assertEqual(patch.get_state_name(), 'accepted')
+
+    def test_conflict(self):
+        patch = create_patch(self.pw)
+        patch.set_state_name('accepted')
+
+        # somebody else rejected the patch in the meantime
+        self.pw._fetch_patch = mock.Mock(return_value=create_patch(self.pw, 'rejected'))
+
+        self.send_next()
+
+        self.pw.update_patch.assert_not_called()
+        self.assertEqual(self.journal.get_pending_count(), 0)
+        self.assertEqual(self.journal.get_conflict_count(), 1)
+        self.assertIsNone(self.journal._get_next())
+
+        # conflicting changes are not applied to patches from the server
+        patch = create_patch(self.pw, 'rejected')
+        self.journal.apply(patch)
+        self.assertEqual(patch.get_state_name(), 'rejected')
+
+        self.assertTrue(self.journal.force(11))
+        self.send_next()
+
+        self.pw.update_patch.assert_called_once_with(11, state='accepted')
+        self.assertEqual(len(self.journal.get_entries()), 0)
+
+    @mock.patch('pwcli.time.monotonic')
+    def test_retry(self, monotonic):
+        monotonic.return_value = 1000
+
+        patch = create_patch(self.pw)
+        patch.set_state_name('accepted')
+
+        error = pwcli.requests.exceptions.ConnectionError('failed')
+        self.pw.update_patch = mock.Mock(side_effect=error)
+
+        self.send_next()
+
+        entries = self.journal.get_entries()
+        self.assertEqual(entries[0]['attempts'], 1)
+        self.assertEqual(entries[0]['error'], 'failed')
+
+        # waits before retrying
+        self.assertIsNone(self.journal._get_next())
+
+        monotonic.return_value = 1000 + pwcli.PatchJournal.RETRY_DELAY_MAX
+        self.assertIsNotNone(self.journal._get_next())
+
+    @mock.patch('pwcli.time.monotonic')
+    def test_unexpected_error(self, monotonic):
+        monotonic.return_value = 1000
+
+        patch = create_patch(self.pw)
+        patch.set_state_name('accepted')
+
+        error = pwcli.requests.exceptions.ConnectionError('failed')
+        self.pw.update_patch = mock.Mock(side_effect=error)
+        self.send_next()
+        self.assertGreater(self.journal.retry_time, 0)
+
+        # an unexpected error doesn't kill the worker, the change is
+        # marked as a conflict and the retry delay is cleared
+        monotonic.return_value = 1000 + pwcli.PatchJournal.RETRY_DELAY_MAX
+        self.pw.update_patch = mock.Mock(side_effect=KeyError('foo'))
+        self.send_next()
+
+        self.assertEqual(self.journal.get_conflict_count(), 1)
+        self.assertEqual(self.journal.retry_time, 0)
+
+    def test_discard(self):
+        patch = create_patch(self.pw)
+        patch.set_state_name('accepted')
+
+        self.assertTrue(self.journal.discard(11))
+        self.assertFalse(self.journal.discard(11))
+
+        journal = pwcli.PatchJournal(self.pw, self.path)
+        self.assertEqual(len(journal.get_entries()), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
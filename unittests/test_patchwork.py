@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2015, The Linux Foundation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+
+import unittest
+import mock
+
+import pwcli
+
+URL = 'http://localhost/api/1.2/patches/'
+
+
+def create_response(page, last=None, status_code=200):
+    response = mock.Mock()
+    response.status_code = status_code
+    response.json = mock.Mock(return_value=[page * 10 + i for i in range(3)])
+    response.links = {}
+
+    if last is None:
+        return response
+
+    if page < last:
+        response.links['next'] = {'url': '%s?project=foo&page=%d' % (URL, page + 1)}
+
+    return response
+
+
+class TestPatchwork(unittest.TestCase):
+    def create_patchwork(self, request):
+        pw = pwcli.Patchwork.__new__(pwcli.Patchwork)
+        pw.config = mock.Mock()
+        pw.config.download_threads = 3
+        pw._request = request
+        return pw
+
+    def get_page(self, url):
+        return pwcli.Patchwork._get_page_number(url)
+
+    def test_page_number(self):
+        self.assertEqual(self.get_page(URL), 1)
+        self.assertEqual(self.get_page(URL + '?project=foo&page=7'), 7)
+
+        url = pwcli.Patchwork._set_page_number(URL + '?project=foo&page=2', 5)
+        self.assertEqual(self.get_page(url), 5)
+        self.assertTrue('project=foo' in url)
+
+    def test_single_page(self):
+        request = mock.Mock(return_value=create_response(1))
+        pw = self.create_patchwork(request)
+
+        (items, roundtrips, seconds) = pw._get_pages(URL, {}, lambda x: x)
+
+        self.assertEqual(items, [10, 11, 12])
+        self.assertEqual(roundtrips, 1)
+
+    def test_last_link(self):
+        last = 5
+
+        def request(method, url, params=None):
+            page = self.get_page(url)
+            response = create_response(page, last)
+            response.links['last'] = {'url': '%s?page=%d' % (URL, last)}
+            return response
+
+        pw = self.create_patchwork(mock.Mock(side_effect=request))
+
+        (items, roundtrips, seconds) = pw._get_pages(URL, {}, lambda x: x)
+
+        expected = [page * 10 + i for page in range(1, last + 1) for i in range(3)]
+        self.assertEqual(items, expected)
+        self.assertEqual(roundtrips, last)
+
+    def test_without_last_link(self):
+        last = 7
+
+        def request(method, url, params=None):
+            page = self.get_page(url)
+
+            if page > last:
+                return create_response(page, status_code=404)
+
+            return create_response(page, last)
+
+        pw = self.create_patchwork(mock.Mock(side_effect=request))
+
+        (items, roundtrips, seconds) = pw._get_pages(URL, {}, lambda x: x)
+
+        expected = [page * 10 + i for page in range(1, last + 1) for i in range(3)]
+        self.assertEqual(items, expected)
+
+    def test_iter_pages(self):
+        last = 20
+
+        def request(method, url, params=None):
+            page = self.get_page(url)
+            response = create_response(page, last)
+            response.links['last'] = {'url': '%s?page=%d' % (URL, last)}
+            return response
+
+        pw = self.create_patchwork(mock.Mock(side_effect=request))
+        pages = pw._iter_pages(URL, {}, lambda x: x)
+
+        # the first page is available before the rest are requested
+        self.assertEqual(next(pages), [10, 11, 12])
+        self.assertEqual(pw._request.call_count, 1)
+
+        # only download-threads pages are downloaded ahead
+        self.assertEqual(next(pages), [20, 21, 22])
+        self.assertTrue(pw._request.call_count <= 1 + 3)
+
+        pages.close()
+
+    def test_error(self):
+        def request(method, url, params=None):
+            page = self.get_page(url)
+
+            if page == 3:
+                raise pwcli.requests.exceptions.ConnectionError('failed')
+
+            return create_response(page, 5)
+
+        pw = self.create_patchwork(mock.Mock(side_effect=request))
+
+        with self.assertRaises(pwcli.requests.exceptions.ConnectionError):
+            pw._get_pages(URL, {}, lambda x: x)
+
+    def test_user_id(self):
+        response = mock.Mock()
+        response.status_code = 200
+        users = [{'username': 'foo', 'id': 5}, {'username': 'foobar', 'id': 6}]
+        response.json = mock.Mock(return_value=users)
+
+        pw = self.create_patchwork(mock.Mock(return_value=response))
+        pw._api_url = 'http://localhost/api/1.2'
+        pw._get_auth_headers = mock.Mock(return_value={})
+        pw.users = pwcli.UserDirectory(None, 'http://localhost/', 3600)
+        pw.user_lock = pwcli.threading.Lock()
+
+        self.assertEqual(pw.get_user_id('foo'), 5)
+        self.assertEqual(pw.get_user_id('foo'), 5)
+
+        # other matches from the same query are stored as well
+        self.assertEqual(pw.get_user_id('foobar'), 6)
+
+        pw._request.assert_called_once()
+
+    def create_retry_patchwork(self, responses):
+        pw = pwcli.Patchwork.__new__(pwcli.Patchwork)
+        pw.config = mock.Mock()
+        pw.config.request_retries = 2
+        pw.config.offline = False
+        pw.limiter = mock.Mock()
+        pw.cassette = None
+        pw.sessions = mock.Mock()
+        pw.session = mock.Mock()
+        pw.session.request = mock.Mock(side_effect=responses)
+        pw.sessions.acquire = mock.Mock(return_value=pw.session)
+        return pw
+
+    @mock.patch('pwcli.time.sleep')
+    def test_retry(self, sleep):
+        busy = create_response(1, status_code=503)
+        busy.headers = {}
+        ok = create_response(1)
+
+        pw = self.create_retry_patchwork([busy, ok])
+
+        self.assertIs(pw._request('GET', URL), ok)
+        self.assertEqual(pw.session.request.call_count, 2)
+        self.assertEqual(sleep.call_count, 1)
+        self.assertEqual(pw.sessions.release.call_count, 2)
+
+    @mock.patch('pwcli.time.sleep')
+    def test_retry_after(self, sleep):
+        throttled = create_response(1, status_code=429)
+        throttled.headers = {'Retry-After': '7'}
+
+        pw = self.create_retry_patchwork([throttled, throttled, throttled])
+
+        # retries run out, the caller gets the last response
+        self.assertIs(pw._request('GET', URL), throttled)
+        self.assertEqual(pw.session.request.call_count, 3)
+        sleep.assert_called_with(7)
+        pw.limiter.release.assert_called_with(mock.ANY, error=True,
+                                              retry_after=7)
+
+    @mock.patch('pwcli.time.sleep')
+    def test_retry_connection_error(self, sleep):
+        error = pwcli.requests.exceptions.ConnectionError('failed')
+        pw = self.create_retry_patchwork([error, error, error])
+
+        with self.assertRaises(pwcli.requests.exceptions.ConnectionError):
+            pw._request('GET', URL)
+
+        self.assertEqual(pw.session.request.call_count, 3)
+        self.assertEqual(sleep.call_count, 2)
+
+    def test_unexpected_error(self):
+        pw = self.create_retry_patchwork([ValueError('foo')])
+
+        with self.assertRaises(ValueError):
+            pw._request('GET', URL)
+
+        # the limiter slot isn't leaked
+        self.assertEqual(pw.limiter.acquire.call_count, 1)
+        self.assertEqual(pw.limiter.release.call_count, 1)
+
+    def test_cassette(self):
+        ok = create_response(1)
+        ok.content = b'[]'
+        ok.reason = 'OK'
+        ok.headers = {'Content-Type': 'application/json'}
+
+        pw = self.create_retry_patchwork([ok])
+        pw.cassette = mock.Mock()
+        pw.cassette.mode = pwcli.Cassette.MODE_RECORD
+
+        self.assertIs(pw._request('GET', URL), ok)
+        pw.cassette.record.assert_called_once_with('GET', URL, {}, ok, mock.ANY)
+
+        # in replay mode the server is not used
+        pw = self.create_retry_patchwork([])
+        pw.cassette = mock.Mock()
+        pw.cassette.mode = pwcli.Cassette.MODE_REPLAY
+        pw.cassette.replay = mock.Mock(return_value=ok)
+
+        self.assertIs(pw._request('GET', URL), ok)
+        pw.session.request.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
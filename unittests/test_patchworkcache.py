@@ -0,0 +1,624 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2015, The Linux Foundation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+
+import unittest
+import mock
+import copy
+import threading
+import tempfile
+import shutil
+import os
+import gzip
+import json
+import datetime
+
+import pwcli
+
+FAKE_PATCH = {
+    'id': 11,
+    'web_url': 'http://www.example.com/',
+    'msgid': '12345678',
+    'date': '2020-04-23T15:06:27',
+    'name': 'nnnn',
+    'commit_ref': None,
+    'state': 'new',
+    'submitter': {'name': 'Ed Example',
+                  'email': 'ed@example.com'},
+    'delegate': {'username': 'dddd'},
+    'mbox': 'http://www.example.com',
+    'series': [],
+    'pull_url': None,
+}
+
+FAKE_COVER = {
+    'id': 300,
+    'web_url': 'http://www.example.com/',
+    'name': 'cccc',
+    'date': '2020-04-23T15:06:27',
+    'submitter': {'name': 'Ed Example',
+                  'email': 'ed@example.com'},
+}
+
+
+def create_patch(patch_id, state, series_id):
+    data = copy.deepcopy(FAKE_PATCH)
+    data['id'] = patch_id
+    data['state'] = state
+
+    if series_id is not None:
+        data['series'] = [{'id': series_id}]
+
+    patch = pwcli.Patch(None)
+    patch.parse_json(data)
+    return patch
+
+
+def create_series(series_id, cover_id):
+    series = pwcli.Series(None)
+    series.parse_json({'id': series_id,
+                       'date': '2020-04-23T15:06:27',
+                       'received_all': True,
+                       'mbox': 'http://www.example.com/',
+                       'patches': [],
+                       'cover_letter': {'id': cover_id}})
+    return series
+
+
+def create_cover(cover_id):
+    data = copy.deepcopy(FAKE_COVER)
+    data['id'] = cover_id
+
+    cover = pwcli.Cover(None)
+    cover.parse_json(data)
+    return cover
+
+
+class TestFetchScheduler(unittest.TestCase):
+    def test_dependent_jobs(self):
+        scheduler = pwcli.FetchScheduler(3)
+        done = []
+        lock = threading.Lock()
+
+        def child(i):
+            lock.acquire()
+            done.append(('child', i))
+            lock.release()
+
+        def parent(i):
+            lock.acquire()
+            done.append(('parent', i))
+            lock.release()
+
+            scheduler.submit('child', child, i)
+
+        for i in range(10):
+            scheduler.submit('parent', parent, i)
+
+        scheduler.wait()
+
+        self.assertEqual(len(done), 20)
+
+        for i in range(10):
+            self.assertLess(done.index(('parent', i)),
+                            done.index(('child', i)))
+
+        self.assertEqual(scheduler.stats['parent']['done'], 10)
+        self.assertEqual(scheduler.stats['child']['done'], 10)
+
+    def test_error(self):
+        scheduler = pwcli.FetchScheduler(2)
+        done = []
+
+        def fail():
+            raise pwcli.PwcliError('failed')
+
+        scheduler.submit('fail', fail)
+        scheduler.submit('ok', done.append, 1)
+
+        with self.assertRaises(pwcli.PwcliError):
+            scheduler.wait()
+
+        # the other jobs still run and the error is reported only once
+        self.assertEqual(done, [1])
+        scheduler.wait()
+
+    def test_group(self):
+        scheduler = pwcli.FetchScheduler(2)
+        event = threading.Event()
+        done = []
+
+        def fail():
+            raise pwcli.PwcliError('failed')
+
+        scheduler.submit('background', event.wait)
+        scheduler.submit('background', fail)
+
+        group = scheduler.create_group()
+        scheduler.submit('sync', done.append, 1, group=group)
+
+        # doesn't wait for the blocked job nor report its error
+        scheduler.wait(group)
+        self.assertEqual(done, [1])
+
+        event.set()
+
+        with self.assertRaises(pwcli.PwcliError):
+            scheduler.wait()
+
+
+class TestPatchworkCache(unittest.TestCase):
+    def setUp(self):
+        self.config = mock.Mock()
+        self.config.persistent_cache = False
+        self.config.download_series = True
+        self.config.lazy_download = False
+        self.config.download_threads = 4
+        self.config.username = 'dddd'
+        self.config.background_states = []
+        self.config.event_sync = False
+
+        patches = {
+            'new': [create_patch(1, 'new', 100), create_patch(2, 'new', 100)],
+            'under-review': [create_patch(3, 'under-review', 200)],
+            'awaiting-upstream': [],
+            'deferred': [create_patch(4, 'deferred', None)],
+        }
+
+        self.pw = mock.Mock()
+        self.pw._get_patches = mock.Mock(side_effect=lambda states, delegate: patches[states[0]])
+        self.pw._iter_patches = self.pw._get_patches
+        self.pw.mail_archive = None
+        self.pw.get_series = mock.Mock(side_effect=lambda i: create_series(i, i + 1))
+        self.pw.get_series_list = mock.Mock(return_value=[])
+        self.pw.get_cover = mock.Mock(side_effect=create_cover)
+        self.pw.get_patch_comments = mock.Mock(return_value=pwcli.Comments(None))
+        self.pw.get_cover_comments = mock.Mock(return_value=pwcli.Comments(None))
+
+    def test_update_cache(self):
+        pw = self.pw
+        cache = pwcli.PatchworkCache(pw, self.config)
+        cache.update_cache()
+
+        self.assertEqual(list(cache.cache.keys()), [1, 2, 3, 4])
+        self.assertEqual(sorted(cache.series.keys()), [100, 200])
+        self.assertEqual(sorted(cache.covers.keys()), [101, 201])
+
+        # every series, cover and comments is requested only once
+        self.assertEqual(pw.get_series.call_count, 2)
+        self.assertEqual(pw.get_cover.call_count, 2)
+        self.assertEqual(pw.get_patch_comments.call_count, 4)
+        self.assertEqual(pw.get_cover_comments.call_count, 2)
+
+        patch = cache.get_patch(1)
+        self.assertEqual(patch.get_series().get_id(), 100)
+        self.assertEqual(patch.get_series().get_cover().get_id(), 101)
+        self.assertIsNotNone(patch.get_comments())
+
+        # nothing changed in the server, nothing is downloaded again
+        pw.get_patch_comments.reset_mock()
+        pw.get_series.reset_mock()
+        (added, updated, removed) = cache.update_cache()
+
+        self.assertEqual(pw.get_patch_comments.call_count, 0)
+        self.assertEqual(pw.get_series.call_count, 0)
+        self.assertEqual(len(cache.cache), 4)
+        self.assertEqual((added, updated, removed), ([], [], []))
+
+    def test_refresh(self):
+        pw = self.pw
+        cache = pwcli.PatchworkCache(pw, self.config)
+        (added, updated, removed) = cache.update_cache()
+
+        self.assertEqual(len(added), 4)
+
+        # patch 1 accepted, 2 moved to under review and 5 is new
+        patches = {
+            'new': [create_patch(5, 'new', None)],
+            'under-review': [create_patch(2, 'under-review', 100),
+                             create_patch(3, 'under-review', 200)],
+            'awaiting-upstream': [],
+            'deferred': [create_patch(4, 'deferred', None)],
+        }
+
+        pw._get_patches = mock.Mock(side_effect=lambda states, delegate: patches[states[0]])
+        patch2 = cache.get_patch(2)
+
+        (added, updated, removed) = cache.update_cache()
+
+        self.assertEqual([p.get_id() for p in added], [5])
+        self.assertEqual(updated, [patch2])
+        self.assertEqual([p.get_id() for p in removed], [1])
+        self.assertEqual(list(cache.cache.keys()), [5, 2, 3, 4])
+
+        # the old object is updated in place
+        self.assertIs(cache.get_patch(2), patch2)
+        self.assertEqual(patch2.get_state_name(), 'under-review')
+
+    def setup_persistent(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+        self.config.persistent_cache = True
+        self.config.pwcli_dir = self.tmpdir
+        self.config.server_url = 'http://localhost/'
+        self.config.project_name = 'foo'
+        self.config.cache_max_age = 24
+        self.config.offline = False
+
+        return os.path.join(self.tmpdir, pwcli.PWCLI_CACHE_FILE)
+
+    def test_persistent(self):
+        self.setup_persistent()
+
+        cache = pwcli.PatchworkCache(self.pw, self.config)
+        cache.update_cache()
+
+        self.pw.reset_mock()
+
+        # a new session loads the cache file and only downloads the
+        # changes since the previous sync
+        cache = pwcli.PatchworkCache(self.pw, self.config)
+        cache.update_cache()
+
+        self.assertEqual(self.pw.get_patch_comments.call_count, 0)
+        self.assertEqual(self.pw.get_series.call_count, 0)
+        self.assertEqual(self.pw.get_cover_comments.call_count, 0)
+
+        self.assertEqual(list(cache.cache.keys()), [1, 2, 3, 4])
+        patch = cache.get_patch(1)
+        self.assertIsNotNone(patch.get_comments())
+        self.assertEqual(patch.get_series().get_cover().get_id(), 101)
+        self.assertIsNotNone(patch.get_series().get_cover().get_comments())
+
+    def test_persistent_version(self):
+        path = self.setup_persistent()
+
+        cache = pwcli.PatchworkCache(self.pw, self.config)
+        cache.update_cache()
+
+        f = gzip.open(path, 'rt', encoding='utf-8')
+        data = json.load(f)
+        f.close()
+
+        data['version'] = pwcli.PWCLI_CACHE_VERSION - 1
+
+        f = gzip.open(path, 'wt', encoding='utf-8')
+        json.dump(data, f)
+        f.close()
+
+        # an old cache file is ignored and everything is downloaded
+        self.pw.reset_mock()
+        cache = pwcli.PatchworkCache(self.pw, self.config)
+        cache.update_cache()
+
+        self.assertEqual(self.pw.get_patch_comments.call_count, 4)
+        self.assertEqual(self.pw.get_series.call_count, 2)
+
+    def test_persistent_delta(self):
+        self.setup_persistent()
+
+        cache = pwcli.PatchworkCache(self.pw, self.config)
+        cache.update_cache()
+
+        # patch 2 changed in the server, only its comments are
+        # downloaded
+        patches = {
+            'new': [create_patch(1, 'new', 100), create_patch(2, 'new', 100)],
+            'under-review': [create_patch(3, 'under-review', 200)],
+            'awaiting-upstream': [],
+            'deferred': [create_patch(4, 'deferred', None)],
+        }
+        patches['new'][1].parse_json(dict(patches['new'][1].get_json(),
+                                          name='changed'))
+        self.pw._get_patches = mock.Mock(side_effect=lambda states, delegate: patches[states[0]])
+
+        self.pw.reset_mock()
+        cache = pwcli.PatchworkCache(self.pw, self.config)
+        cache.update_cache()
+
+        self.pw.get_patch_comments.assert_called_once()
+        self.assertEqual(self.pw.get_patch_comments.call_args[0][0], 2)
+
+        # the cache is too old, full resync
+        synced = pwcli.utcnow() - datetime.timedelta(hours=25)
+        cache.synced = synced.strftime('%Y-%m-%dT%H:%M:%S')
+        cache.save()
+
+        self.pw.reset_mock()
+        cache = pwcli.PatchworkCache(self.pw, self.config)
+        self.assertFalse(cache.load())
+
+        cache.update_cache()
+        self.assertEqual(self.pw.get_patch_comments.call_count, 4)
+
+    def test_indexes(self):
+        pw = self.pw
+        cache = pwcli.PatchworkCache(pw, self.config)
+        pw.cache = cache
+        cache.update_cache()
+
+        self.assertEqual(sorted(cache.by_state.keys()),
+                         ['deferred', 'new', 'under-review'])
+        self.assertEqual(sorted(cache.by_series[100].keys()), [1, 2])
+        self.assertEqual(cache.get_submitters(), ['Ed Example <ed@example.com>'])
+
+        patches = cache.get_patches(['new'], 'dddd')
+        self.assertEqual([p.get_id() for p in patches], [1, 2])
+        self.assertEqual(cache.get_patches(['new'], 'foo'), [])
+
+        # identical queries are memoized
+        generation = cache.generation
+        self.assertEqual(cache.get_patches(['new'], 'dddd'), patches)
+        self.assertIn((('new',), 'dddd'), cache.queries)
+
+        # a local state change updates the indexes
+        patch = cache.get_patch(1)
+        patch.pw = pw
+        patch.apply_changes(state='under-review')
+
+        self.assertGreater(cache.generation, generation)
+        self.assertEqual([p.get_id() for p in cache.get_patches(['new'])], [2])
+        self.assertEqual(sorted([p.get_id() for p in cache.get_patches(['under-review'])]),
+                         [1, 3])
+
+        # so does a removal in the server
+        patches = {
+            'new': [create_patch(2, 'new', 100)],
+            'under-review': [create_patch(3, 'under-review', 200)],
+            'awaiting-upstream': [],
+            'deferred': [],
+        }
+        pw._get_patches = mock.Mock(side_effect=lambda states, delegate: patches[states[0]])
+        cache.update_cache()
+
+        self.assertEqual(sorted(cache.indexed.keys()), [2, 3])
+        self.assertNotIn('deferred', cache.by_state)
+        self.assertNotIn(None, cache.by_series)
+        self.assertEqual(sorted(cache.by_series[100].keys()), [2])
+        self.assertEqual([p.get_id() for p in cache.get_patches(None)], [2, 3])
+
+    def test_lazy(self):
+        self.config.lazy_download = True
+
+        pw = self.pw
+        cache = pwcli.PatchworkCache(pw, self.config)
+
+        # block the background downloads until the test is ready
+        event = threading.Event()
+
+        def get_patch_comments(patch_id, msgid=None):
+            event.wait()
+            return pwcli.Comments(None)
+
+        pw.get_patch_comments = mock.Mock(side_effect=get_patch_comments)
+
+        cache.update_cache()
+
+        self.assertEqual(list(cache.cache.keys()), [1, 2, 3, 4])
+        self.assertTrue(cache.is_patch_pending(cache.get_patch(3)))
+
+        cache.prioritize([cache.get_patch(3)])
+
+        event.set()
+        cache.scheduler.wait()
+
+        for patch in cache.cache.values():
+            self.assertFalse(cache.is_patch_pending(patch))
+            self.assertIsNotNone(patch.get_comments())
+
+        self.assertEqual(pw.get_patch_comments.call_count, 4)
+        self.assertEqual(pw.get_series.call_count, 2)
+        self.assertEqual(cache.get_patch(3).get_cover().get_id(), 201)
+        self.assertFalse(cache.is_cover_pending(cache.covers[201]))
+
+    def test_lazy_refresh(self):
+        self.config.lazy_download = True
+
+        pw = self.pw
+        cache = pwcli.PatchworkCache(pw, self.config)
+
+        # block the comments of patch 1 until the test is ready
+        event = threading.Event()
+
+        def get_patch_comments(patch_id, msgid=None):
+            if patch_id == 1:
+                event.wait()
+
+            return pwcli.Comments(None)
+
+        pw.get_patch_comments = mock.Mock(side_effect=get_patch_comments)
+
+        cache.update_cache()
+
+        # a refresh doesn't wait for the background downloads, and
+        # doesn't forget the downloads still in progress
+        thread = threading.Thread(target=cache.update_cache)
+        thread.start()
+        thread.join(10)
+        self.assertFalse(thread.is_alive())
+
+        self.assertTrue(cache.is_patch_pending(cache.get_patch(1)))
+
+        event.set()
+        cache.scheduler.wait()
+
+        for patch in cache.cache.values():
+            self.assertFalse(cache.is_patch_pending(patch))
+            self.assertIsNotNone(patch.get_comments())
+
+        # the comments are still downloaded only once
+        self.assertEqual(pw.get_patch_comments.call_count, 4)
+
+    def test_background_states(self):
+        self.config.background_states = ['deferred']
+
+        pw = self.pw
+        cache = pwcli.PatchworkCache(pw, self.config)
+
+        # block the background download until the test is ready
+        event = threading.Event()
+        deferred = [create_patch(4, 'deferred', None)]
+
+        def iter_patches(states, delegate):
+            event.wait()
+            yield from deferred
+
+        pw._iter_patches = mock.Mock(side_effect=iter_patches)
+
+        cache.update_cache()
+
+        self.assertEqual(list(cache.cache.keys()), [1, 2, 3])
+        self.assertEqual(cache.get_loading_states(pwcli.PATCH_ACTIVE_STATES),
+                         ['deferred'])
+
+        event.set()
+        cache.scheduler.wait()
+
+        self.assertEqual(list(cache.cache.keys()), [1, 2, 3, 4])
+        self.assertEqual(cache.get_loading_states(pwcli.PATCH_ACTIVE_STATES), [])
+        self.assertIsNotNone(cache.get_patch(4).get_comments())
+
+        # only the first update is done in the background
+        cache.update_cache()
+        self.assertEqual(pw._iter_patches.call_count, 1)
+
+    def test_background_states_error(self):
+        self.config.background_states = ['deferred']
+
+        pw = self.pw
+        cache = pwcli.PatchworkCache(pw, self.config)
+
+        request_patch = cache._request_patch
+
+        def fail(patch, priority):
+            if patch.get_id() == 4:
+                raise ValueError('failed')
+
+            request_patch(patch, priority)
+
+        pw._iter_patches = mock.Mock(return_value=[create_patch(4, 'deferred', None)])
+        cache._request_patch = mock.Mock(side_effect=fail)
+
+        cache.update_cache()
+
+        # the error is only logged
+        cache.scheduler.wait()
+
+        # the lock is released and the state isn't left loading
+        self.assertFalse(cache.lock.locked())
+        self.assertEqual(cache.get_loading_states(pwcli.PATCH_ACTIVE_STATES), [])
+
+    def test_event_sync(self):
+        self.config.event_sync = True
+
+        pw = self.pw
+        cache = pwcli.PatchworkCache(pw, self.config)
+        cache.update_cache()
+
+        self.assertIsNotNone(cache.events_cursor)
+        cache.events_cursor = ('2020-04-24T00:00:00', [])
+
+        other = create_patch(6, 'new', None)
+        other.parse_json(dict(other.get_json(), delegate={'username': 'oooo'}))
+        server = {1: create_patch(1, 'accepted', 100),
+                  3: create_patch(3, 'under-review', 200),
+                  5: create_patch(5, 'new', None),
+                  6: other}
+
+        def event(event_id, category, patch_id):
+            return {'id': event_id, 'category': category,
+                    'date': '2020-04-24T10:00:0%d' % (event_id),
+                    'payload': {'patch': {'id': patch_id}}}
+
+        events = [
+            event(1, 'patch-state-changed', 1),
+            event(2, 'patch-comment-created', 3),
+            event(3, 'patch-created', 5),
+            event(4, 'patch-created', 6),
+            event(5, 'patch-delegated', 7),
+            {'id': 6, 'category': 'series-completed',
+             'date': '2020-04-24T10:00:05',
+             'payload': {'series': {'id': 999}}},
+        ]
+
+        # like the server, return events since the date
+        pw.get_events = mock.Mock(side_effect=lambda since: [e for e in events if e['date'] >= since])
+        pw._fetch_patch = mock.Mock(side_effect=lambda i: server.get(i))
+        pw._get_patches.reset_mock()
+        pw.get_patch_comments.reset_mock()
+        pw.get_series.reset_mock()
+
+        (added, updated, removed) = cache.update_cache()
+
+        # patch lists are not downloaded, only the affected patches
+        pw._get_patches.assert_not_called()
+        self.assertEqual(sorted([c[0][0] for c in pw._fetch_patch.call_args_list]),
+                         [1, 3, 5, 6])
+
+        self.assertEqual([p.get_id() for p in added], [5])
+        self.assertEqual([p.get_id() for p in removed], [1])
+        self.assertEqual(sorted(cache.cache.keys()), [2, 3, 4, 5])
+
+        # comments for the commented and the new patch
+        self.assertEqual(sorted([c[0][0] for c in pw.get_patch_comments.call_args_list]),
+                         [3, 5])
+
+        # series not in the cache is not downloaded
+        pw.get_series.assert_not_called()
+
+        self.assertEqual(cache.events_cursor, ('2020-04-24T10:00:05', [5, 6]))
+
+        # events already handled are skipped
+        pw._fetch_patch.reset_mock()
+        cache.update_cache()
+        pw._fetch_patch.assert_not_called()
+
+    def test_event_sync_not_supported(self):
+        self.config.event_sync = True
+
+        pw = self.pw
+        cache = pwcli.PatchworkCache(pw, self.config)
+        cache.update_cache()
+
+        pw.get_events = mock.Mock(side_effect=pwcli.PwcliError('not found'))
+        pw._get_patches.reset_mock()
+
+        cache.update_cache()
+
+        # falls back to downloading the patch lists
+        self.assertEqual(pw._get_patches.call_count, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
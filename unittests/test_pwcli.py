@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2015, The Linux Foundation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+
+import unittest
+import mock
+import copy
+import threading
+
+import pwcli
+
+FAKE_PATCH = {
+    'id': 11,
+    'web_url': 'http://www.example.com/',
+    'msgid': '<12345678>',
+    'date': '2020-04-23T15:06:27',
+    'name': 'nnnn',
+    'commit_ref': None,
+    'state': 'new',
+    'submitter': {'name': 'Ed Example',
+                  'email': 'ed@example.com'},
+    'delegate': {'username': 'dddd'},
+    'mbox': 'http://www.example.com/patch/11/mbox/',
+    'series': [],
+    'pull_url': None,
+}
+
+
+def create_patch(pw, patch_id, series_id):
+    data = copy.deepcopy(FAKE_PATCH)
+    data['id'] = patch_id
+    data['name'] = 'patch %d' % (patch_id)
+    data['msgid'] = '<%d@example.com>' % (patch_id)
+    data['mbox'] = 'http://www.example.com/patch/%d/mbox/' % (patch_id)
+
+    if series_id is not None:
+        data['series'] = [{'id': series_id}]
+
+    patch = pwcli.Patch(pw)
+    patch.parse_json(data)
+    return patch
+
+
+def create_mail(patch_id):
+    return 'Subject: patch %d\nMessage-Id: <%d@example.com>\n\nbody\n' % \
+        (patch_id, patch_id)
+
+
+class TestPWCLI(unittest.TestCase):
+    def setUp(self):
+        self.pwcli = pwcli.PWCLI.__new__(pwcli.PWCLI)
+        self.pwcli.output = mock.Mock()
+        self.pwcli.config = mock.Mock()
+        self.pwcli.config.download_threads = 3
+
+        self.pw = mock.Mock()
+        self.pw.mbox_store = None
+        self.pw.mail_archive = None
+        self.pw.journal = None
+        self.pw.get_mbox = mock.Mock(side_effect=lambda url: create_mail(int(url.split('/')[-3])))
+        self.pwcli.pw = self.pw
+
+        series = pwcli.Series(self.pw)
+        series.parse_json({'id': 100,
+                           'date': '2020-04-23T15:06:27',
+                           'received_all': True,
+                           'mbox': 'http://www.example.com/series/100/mbox/',
+                           'patches': [{'id': 1}, {'id': 2}, {'id': 3}],
+                           'cover_letter': None})
+        self.pw.get_series = mock.Mock(return_value=series)
+
+        mbox = ''.join(['From patchwork Thu Feb 10 15:23:31 2011\n%s\n' % (create_mail(i)) for i in [1, 2, 3]])
+        self.pw.get_series_mboxes = mock.Mock(return_value=pwcli.split_mbox(mbox))
+
+    def test_prefetch_series(self):
+        patches = [create_patch(self.pw, i, 100) for i in [1, 2, 3]]
+        patches.append(create_patch(self.pw, 4, None))
+
+        self.pwcli.prefetch_patches(patches)
+
+        self.pw.get_series_mboxes.assert_called_once()
+        self.pw.get_mbox.assert_called_once_with('http://www.example.com/patch/4/mbox/')
+
+        for patch in patches:
+            self.assertEqual(patch.get_mbox(), create_mail(patch.get_id()))
+            self.assertEqual(patch.get_name(), 'patch %d' % (patch.get_id()))
+
+        self.assertEqual(self.pwcli.output.call_count, 4)
+
+    def test_prefetch_partial_series(self):
+        # not all patches of the series selected, download separately
+        patches = [create_patch(self.pw, i, 100) for i in [1, 2]]
+
+        self.pwcli.prefetch_patches(patches)
+
+        self.pw.get_series_mboxes.assert_not_called()
+        self.assertEqual(self.pw.get_mbox.call_count, 2)
+
+        for patch in patches:
+            self.assertEqual(patch.get_mbox(), create_mail(patch.get_id()))
+
+    def test_prefetch_error(self):
+        self.pw.get_mbox = mock.Mock(side_effect=pwcli.requests.exceptions.ConnectionError('failed'))
+        patches = [create_patch(self.pw, i, None) for i in [1, 2, 3]]
+
+        with self.assertRaises(pwcli.requests.exceptions.ConnectionError):
+            self.pwcli.prefetch_patches(patches)
+
+    def test_prefetch_unexpected_error(self):
+        self.pw.get_mbox = mock.Mock(side_effect=KeyError('foo'))
+        patches = [create_patch(self.pw, i, None) for i in [1, 2, 3]]
+
+        # doesn't hang waiting for the results
+        with self.assertRaises(KeyError):
+            self.pwcli.prefetch_patches(patches)
+
+    def test_am_patches_fallback(self):
+        self.pwcli.git = mock.Mock()
+        self.pwcli.git.get_commits = mock.Mock(side_effect=lambda count: ['commit'] * count)
+        self.pwcli.config.msgid_tag = 'Link: %s'
+        patches = [create_patch(self.pw, i, None) for i in [1, 2, 3]]
+
+        def get_mbox_for_am(patch, tags):
+            # the tag can't be added to the mail of patch 2
+            if patch.get_id() == 2 and len(tags) > 0:
+                return None
+
+            return 'mbox %d %s\n' % (patch.get_id(), tags)
+
+        applied = []
+
+        with mock.patch.object(pwcli.Patch, 'get_mbox_for_am', autospec=True,
+                               side_effect=get_mbox_for_am):
+            self.pwcli.am_patches(patches, applied)
+
+        self.assertEqual(applied, patches)
+        self.assertEqual(self.pwcli.git.am.call_count, 3)
+        self.pwcli.git.am.assert_any_call('mbox 2 []\n', applied_cb=mock.ANY)
+        self.pwcli.git.add_tag.assert_called_once_with('Link: 2@example.com')
+
+    def test_update_patches(self):
+        patches = [create_patch(self.pw, i, None) for i in [1, 2, 3]]
+        updates = [(patch, {'state': 'accepted', 'commit_ref': 'abc%d' % (patch.get_id())})
+                   for patch in patches]
+
+        failed = self.pwcli.update_patches(updates, 'Setting patch state')
+
+        self.assertEqual(failed, [])
+
+        # only one request per patch
+        self.assertEqual(self.pw.update_patch.call_count, 3)
+        self.pw.update_patch.assert_any_call(2, state='accepted',
+                                             commit_ref='abc2', delegate=None)
+
+        for patch in patches:
+            self.assertEqual(patch.get_state_name(), 'accepted')
+            self.assertEqual(patch.get_commit_ref(), 'abc%d' % (patch.get_id()))
+
+    def test_update_patches_error(self):
+        def update_patch(patch_id, **kwargs):
+            if patch_id == 2:
+                raise pwcli.requests.exceptions.HTTPError('500 Server Error')
+
+        self.pw.update_patch = mock.Mock(side_effect=update_patch)
+        patches = [create_patch(self.pw, i, None) for i in [1, 2, 3]]
+        updates = [(patch, {'state': 'rejected'}) for patch in patches]
+
+        failed = self.pwcli.update_patches(updates, 'Setting patch state')
+
+        self.assertEqual(len(failed), 1)
+        self.assertIs(failed[0], patches[1])
+        self.pwcli.output.assert_any_call('Failed to update patch 2: 500 Server Error')
+
+        self.assertEqual(patches[0].get_state_name(), 'rejected')
+        self.assertEqual(patches[1].get_state_name(), 'new')
+        self.assertEqual(patches[2].get_state_name(), 'rejected')
+
+    def test_update_patches_unexpected_error(self):
+        def update_patch(patch_id, **kwargs):
+            if patch_id == 2:
+                raise KeyError('foo')
+
+        self.pw.update_patch = mock.Mock(side_effect=update_patch)
+        patches = [create_patch(self.pw, i, None) for i in [1, 2, 3]]
+        updates = [(patch, {'state': 'rejected'}) for patch in patches]
+
+        failed = self.pwcli.update_patches(updates, 'Setting patch state')
+
+        self.assertEqual(failed, [patches[1]])
+        self.pwcli.output.assert_any_call("Failed to update patch 2: 'foo'")
+
+    @mock.patch('pwcli.time.sleep')
+    def test_refresh_unexpected_error(self, sleep):
+        class Stop(Exception):
+            pass
+
+        # the third interval ends the test
+        sleep.side_effect = [None, None, Stop()]
+
+        self.pwcli.config.refresh_interval = 1
+        self.pwcli.busy = threading.Lock()
+        self.pw.cache.update_cache = mock.Mock(side_effect=KeyError('foo'))
+
+        with self.assertRaises(Stop):
+            self.pwcli._refresh_work()
+
+        # the refresh continues after an error and the lock is released
+        self.assertEqual(self.pw.cache.update_cache.call_count, 2)
+        self.assertFalse(self.pwcli.busy.locked())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2015, The Linux Foundation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+
+import unittest
+import mock
+
+import pwcli
+
+
+class TestRequestLimiter(unittest.TestCase):
+    def run_requests(self, limiter, count, latency, error=False):
+        for i in range(count):
+            limiter.acquire()
+            limiter.release(latency, error=error)
+
+    def test_adapt(self):
+        limiter = pwcli.RequestLimiter(8)
+        self.assertEqual(limiter.limit, 8)
+
+        # errors halve the limit once per window
+        self.run_requests(limiter, 2, 0.1, error=True)
+        self.assertEqual(limiter.limit, 4)
+
+        self.run_requests(limiter, 2, 0.1)
+        self.assertEqual(limiter.limit, 4)
+
+        # a full window of successful requests increases the limit
+        self.run_requests(limiter, 4, 0.1)
+        self.assertEqual(limiter.limit, 5)
+
+        # growing latency decreases it
+        self.run_requests(limiter, 5, 1.0)
+        self.assertEqual(limiter.limit, 4)
+
+    @mock.patch('pwcli.time.monotonic')
+    def test_rate(self, monotonic):
+        monotonic.return_value = 100
+        limiter = pwcli.RequestLimiter(8, max_rate=2)
+        limiter.cond = mock.MagicMock()
+
+        # the bucket is full in the beginning
+        self.run_requests(limiter, 2, 0.1)
+        limiter.cond.wait.assert_not_called()
+
+        def wait(timeout=None):
+            monotonic.return_value += timeout
+
+        limiter.cond.wait = mock.Mock(side_effect=wait)
+        limiter.acquire()
+        limiter.cond.wait.assert_called_once_with(0.5)
+
+    @mock.patch('pwcli.time.monotonic')
+    def test_retry_after(self, monotonic):
+        monotonic.return_value = 100
+        limiter = pwcli.RequestLimiter(8)
+        limiter.cond = mock.MagicMock()
+
+        limiter.acquire()
+        limiter.release(0.1, error=True, retry_after=10)
+
+        def wait(timeout=None):
+            monotonic.return_value += timeout
+
+        limiter.cond.wait = mock.Mock(side_effect=wait)
+        limiter.acquire()
+        limiter.cond.wait.assert_called_once_with(10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2015, The Linux Foundation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+
+import unittest
+import mock
+import tempfile
+import shutil
+import os
+
+import pwcli
+
+SERVER_URL = 'http://localhost:8000/'
+
+
+class TestUserDirectory(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'users.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_add(self):
+        users = pwcli.UserDirectory(self.path, SERVER_URL, 3600)
+
+        self.assertIsNone(users.get_id('foo'))
+
+        users.add([('foo', 5), ('bar', 6)])
+
+        self.assertEqual(users.get_id('foo'), 5)
+        self.assertEqual(users.get_usernames(), ['bar', 'foo'])
+
+        # a new directory finds the users from the disk
+        users = pwcli.UserDirectory(self.path, SERVER_URL, 3600)
+        self.assertEqual(users.get_id('bar'), 6)
+
+        # but not if the server is different
+        users = pwcli.UserDirectory(self.path, 'http://example.com/', 3600)
+        self.assertIsNone(users.get_id('bar'))
+
+    @mock.patch('pwcli.time.time')
+    def test_expire(self, time):
+        time.return_value = 1000
+        users = pwcli.UserDirectory(self.path, SERVER_URL, 3600)
+        users.add([('foo', 5)])
+
+        time.return_value = 1000 + 3600
+        self.assertEqual(users.get_id('foo'), 5)
+
+        time.return_value = 1000 + 3601
+        self.assertIsNone(users.get_id('foo'))
+
+        # usernames are still available for completion
+        self.assertEqual(users.get_usernames(), ['foo'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -112,6 +112,40 @@ class TestUtils(unittest.TestCase):
         self.assertEqual(f(d('2020-01-01T00:00:01')), '0h')
         self.assertEqual(f(d('2020-01-01T00:59:59')), '0h')
 
+    def test_split_mbox(self):
+        f = pwcli.split_mbox
+
+        mail1 = 'Subject: [1/2] foo: test 1\nMessage-Id: <11111@example.com>\n\nFoo commit log.\n\nFrom the body, not a new mail\n'
+        mail2 = 'Subject: [2/2] foo: test 2\nMessage-ID:\n <22222@example.com>\n\nFoo commit log.\n'
+        unixfrom = 'From patchwork Thu Feb 10 15:23:31 2011\n'
+
+        mbox = unixfrom + mail1 + '\n' + unixfrom + mail2
+        result = f(mbox)
+
+        self.assertEqual(list(result.keys()), ['11111@example.com', '22222@example.com'])
+        self.assertEqual(result['11111@example.com'], mail1)
+        self.assertEqual(result['22222@example.com'], mail2)
+
+        # an mbox without 'From ' lines is just one mail
+        self.assertEqual(f(mail1), {'11111@example.com': mail1})
+
+        self.assertEqual(f(''), {})
+
+    def test_parse_retry_after(self):
+        f = pwcli.parse_retry_after
+
+        self.assertEqual(f('120'), 120)
+        self.assertEqual(f('-5'), 0)
+        self.assertEqual(f(None), None)
+        self.assertEqual(f('foo'), None)
+
+        # a date in the past means no wait
+        self.assertEqual(f('Wed, 21 Oct 2015 07:28:00 GMT'), 0)
+
+        date = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(minutes=2)
+        seconds = f(date.strftime('%a, %d %b %Y %H:%M:%S GMT'))
+        self.assertTrue(100 < seconds <= 120)
+
 
 if __name__ == '__main__':
     unittest.main()